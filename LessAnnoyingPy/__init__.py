@@ -11,6 +11,21 @@ Contact(FullName=None, Salutation=None, FirstName=None, MiddleName=None,
              Email=None, Phone=None, Address=None, Website=None, Birthday=None,
              CustomFields=None, AssignedTo=None, ContactId=None)
     Contact template to ease the process of the CRM class
+TransferStats()
+    Byte counters for the requests made by a CRM instance
+
+Modules
+-------
+results
+    Typed, lazily decoded result objects returned by every CRM call
+notes
+    NoteCoalescer, which merges bursts of notes into one call per contact
+validation
+    Validator, which checks payloads locally before they are sent
+analytics
+    PipelineAggregator, which streams grouped stats over a pipeline report
+feed
+    ChangeFeed, which polls the CRM once and emits change events to subscribers
 """
 
 __version__ = "1.0.0"
@@ -0,0 +1,67 @@
+"""
+JSON backend selection for LessAnnoyingPy
+
+Uses orjson or ujson when one of them is installed and falls back to the
+standard library json module otherwise
+
+Functions
+---------
+loads(data)
+    Decode a JSON document from bytes or str
+dumps(obj)
+    Encode an object as compact UTF-8 JSON bytes
+"""
+
+try:
+    import orjson as _backend
+    BACKEND = 'orjson'
+except ImportError:
+    try:
+        import ujson as _backend
+        BACKEND = 'ujson'
+    except ImportError:
+        import json as _backend
+        BACKEND = 'json'
+
+
+def loads(data):
+    """Decode a JSON document
+
+    Parameters
+    ----------
+    data : bytes or str
+        Raw JSON document
+
+    Returns
+    -------
+    object
+        Decoded python object
+    """
+
+    if BACKEND == 'ujson' and isinstance(data, (bytes, bytearray)):
+        data = data.decode('utf-8')
+
+    return _backend.loads(data)
+
+
+def dumps(obj):
+    """Encode an object as compact JSON
+
+    Parameters
+    ----------
+    obj : object
+        Python object to encode
+
+    Returns
+    -------
+    bytes
+        UTF-8 encoded JSON without insignificant whitespace
+    """
+
+    if BACKEND == 'orjson':
+        return _backend.dumps(obj, option=_backend.OPT_NON_STR_KEYS)
+    if BACKEND == 'ujson':
+        return _backend.dumps(obj, ensure_ascii=False,
+                              escape_forward_slashes=False).encode('utf-8')
+    return _backend.dumps(obj, separators=(',', ':'),
+                          ensure_ascii=False).encode('utf-8')
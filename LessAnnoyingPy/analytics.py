@@ -0,0 +1,352 @@
+"""
+Streaming aggregation over pipeline reports
+
+Classes
+-------
+PipelineStats(status_names=None)
+    Grouped counts and age per status for a set of pipeline items
+PipelineAggregator(crm, PipelineId, NumRows=500, StatusFilter="all",
+                   UserFilter=None, incremental=True)
+    Aggregates a pipeline report page by page with incremental refresh
+"""
+
+import hashlib
+import time
+from collections import Counter
+from datetime import datetime
+
+_DATE_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d')
+
+
+def _timestamp(value):
+    if not value:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    for date_format in _DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).timestamp()
+        except ValueError:
+            continue
+    return None
+
+
+class PipelineStats:
+    """Grouped counts and age per status for a set of pipeline items
+
+    For every status the sum, minimum and maximum of the items' date_field
+    are kept, so ages stay valid as time passes and stats can be merged
+    without keeping the items themselves. date_field defaults to DateNote,
+    the date of the last pipeline update, which any note or update resets.
+    The ages are therefore the time since each item was last updated. They
+    only measure time in status when date_field holds the date of the last
+    status change
+
+    Attributes
+    ----------
+    total : int
+        Number of pipeline items
+    by_status : collections.Counter
+        Item count per status name
+    by_user : collections.Counter
+        Item count per assigned user
+    by_priority : collections.Counter
+        Item count per priority
+
+    Methods
+    -------
+    add(item, status_field='StatusId', user_field='UserId',
+        priority_field='Priority', date_field='DateNote')
+        Count one pipeline item
+    merge(other)
+        Add the counts of another PipelineStats
+    time_since_update(now=None)
+        Seconds since date_field, grouped by status
+    """
+
+    def __init__(self, status_names=None):
+        """
+        Parameters
+        ----------
+        status_names : dict, optional
+            Maps StatusIds to the names used as keys of by_status
+
+        Returns
+        -------
+        PipelineStats
+            PipelineStats instance
+        """
+        self.status_names = status_names or {}
+        self.total = 0
+        self.by_status = Counter()
+        self.by_user = Counter()
+        self.by_priority = Counter()
+        self.__updated = {}
+
+    def add(self, item, status_field='StatusId', user_field='UserId',
+            priority_field='Priority', date_field='DateNote'):
+        """Count one pipeline item
+
+        Parameters
+        ----------
+        item : Mapping
+            Pipeline report row
+        status_field : str, optional
+            Key holding the StatusId
+        user_field : str, optional
+            Key holding the assigned user
+        priority_field : str, optional
+            Key holding the priority
+        date_field : str, optional
+            Key holding the date ages are measured from. The default,
+            DateNote, is the date of the last pipeline update
+        """
+
+        status_id = item.get(status_field)
+        status = self.status_names.get(str(status_id), status_id)
+
+        self.total += 1
+        self.by_status[status] += 1
+        self.by_user[item.get(user_field)] += 1
+        self.by_priority[item.get(priority_field)] += 1
+
+        updated = _timestamp(item.get(date_field))
+        if updated is not None:
+            count, total, first, last = self.__updated.get(
+                status, (0, 0.0, updated, updated))
+            self.__updated[status] = (count + 1, total + updated,
+                                      min(first, updated), max(last, updated))
+
+    def merge(self, other):
+        """Add the counts of another PipelineStats
+
+        Parameters
+        ----------
+        other : PipelineStats
+            Stats to add to this one
+
+        Returns
+        -------
+        PipelineStats
+            This instance
+        """
+
+        self.total += other.total
+        self.by_status.update(other.by_status)
+        self.by_user.update(other.by_user)
+        self.by_priority.update(other.by_priority)
+
+        for status, (count, total, first, last) in other.__updated.items():
+            if status in self.__updated:
+                c, t, f, la = self.__updated[status]
+                self.__updated[status] = (c + count, t + total,
+                                          min(f, first), max(la, last))
+            else:
+                self.__updated[status] = (count, total, first, last)
+        return self
+
+    def time_since_update(self, now=None):
+        """Seconds since date_field, grouped by status
+
+        Parameters
+        ----------
+        now : float, optional
+            Reference time as a unix timestamp. Defaults to the current time
+
+        Returns
+        -------
+        dict
+            Maps each status name to a dict with the keys 'count', 'mean',
+            'min' and 'max'
+        """
+
+        if now is None:
+            now = time.time()
+
+        return {status: {'count': count,
+                         'mean': now - total / count,
+                         'min': now - last,
+                         'max': now - first}
+                for status, (count, total, first, last)
+                in self.__updated.items()}
+
+    def to_dict(self, now=None):
+        """Return every statistic as plain python types
+
+        Parameters
+        ----------
+        now : float, optional
+            Reference time passed to time_since_update
+
+        Returns
+        -------
+        dict
+            Statistics
+        """
+
+        return {'total': self.total,
+                'by_status': dict(self.by_status),
+                'by_user': dict(self.by_user),
+                'by_priority': dict(self.by_priority),
+                'time_since_update': self.time_since_update(now)}
+
+
+class PipelineAggregator:
+    """Aggregates a pipeline report page by page with incremental refresh
+
+    Rows are folded into stats as each page is read and are never kept.
+    With incremental=True a digest of every raw page and that page's own
+    PipelineStats are kept, and on refresh() pages whose body did not
+    change reuse their previous stats instead of being decoded and
+    aggregated again. That cache costs one PipelineStats per page, which is
+    sized by the number of distinct statuses, users and priorities on the
+    page rather than its rows, but it does grow with the number of pages.
+    With incremental=False only the running totals are kept and memory is
+    constant. Every page is downloaded on each refresh either way; only the
+    decoding and aggregation of unchanged pages is skipped.
+
+    Status names are reloaded from GetPipelineSettings on every refresh.
+    When they change, the page cache is dropped so renamed or new statuses
+    show up everywhere
+
+    Attributes
+    ----------
+    stats : PipelineStats
+        Result of the last refresh
+    pages_aggregated : int
+        Pages decoded and aggregated by the last refresh
+    pages_reused : int
+        Pages skipped by the last refresh because they did not change
+
+    Methods
+    -------
+    refresh()
+        Fetch the report and update stats
+    """
+
+    def __init__(self, crm, PipelineId, NumRows=500, StatusFilter="all",
+                 UserFilter=None, status_field='StatusId', user_field='UserId',
+                 priority_field='Priority', date_field='DateNote',
+                 incremental=True):
+        """
+        Parameters
+        ----------
+        crm : LACRM
+            CRM instance used to fetch the report
+        PipelineId : str
+            Unique identifier of the pipeline to aggregate
+        NumRows : int, optional
+            Rows fetched per page, between 1 and 500
+        StatusFilter : str, optional
+            Passed to get_pipeline_report. Defaults to every status
+        UserFilter : str, optional
+            Passed to get_pipeline_report
+        status_field, user_field, priority_field, date_field : str, optional
+            Keys of the report rows used for grouping, see PipelineStats.add
+        incremental : bool, optional
+            Keep per-page stats so unchanged pages are not aggregated again
+
+        Returns
+        -------
+        PipelineAggregator
+            PipelineAggregator instance
+        """
+        self.crm = crm
+        self.PipelineId = PipelineId
+        self.NumRows = NumRows
+        self.StatusFilter = StatusFilter
+        self.UserFilter = UserFilter
+        self.fields = {'status_field': status_field,
+                       'user_field': user_field,
+                       'priority_field': priority_field,
+                       'date_field': date_field}
+        self.incremental = incremental
+
+        self.stats = None
+        self.pages_aggregated = 0
+        self.pages_reused = 0
+        self.__status_names = None
+        self.__pages = []
+
+    @property
+    def status_names(self):
+        """StatusId to status name map from GetPipelineSettings, reloaded
+        by every refresh"""
+        if self.__status_names is None:
+            self.__status_names = self.__load_status_names()
+        return self.__status_names
+
+    def __load_status_names(self):
+        settings = self.crm.get_pipeline_settings()
+        if not settings.success:
+            raise RuntimeError('GetPipelineSettings failed: {}'.format(
+                settings.error or settings.status_code))
+        names = {}
+        for pipeline in settings.records:
+            if str(pipeline.get('PipelineId')) != str(self.PipelineId):
+                continue
+            for status in pipeline.get('Statuses') or ():
+                names[str(status.get('StatusId'))] = status.get('Name')
+        return names
+
+    def refresh(self):
+        """Fetch the report and update stats
+
+        Returns
+        -------
+        PipelineStats
+            Aggregated statistics over every page of the report
+
+        Raises
+        ------
+        RuntimeError
+            When a page could not be fetched. stats keeps the result of the
+            last complete refresh
+        """
+
+        status_names = self.__load_status_names()
+        cached = self.__pages if status_names == self.__status_names else []
+        stats = PipelineStats(status_names)
+        pages = []
+        self.pages_aggregated = 0
+        self.pages_reused = 0
+
+        Page = 1
+        while True:
+            result = self.crm.get_pipeline_report(
+                self.PipelineId, NumRows=self.NumRows, Page=Page,
+                StatusFilter=self.StatusFilter, UserFilter=self.UserFilter)
+            digest = hashlib.sha1(result.content).digest()
+
+            if Page <= len(cached) and cached[Page - 1][0] == digest:
+                page_stats, full = cached[Page - 1][1:]
+                self.pages_reused += 1
+            else:
+                if not result.success:
+                    raise RuntimeError(
+                        'GetPipelineReport failed on page {}: {}'.format(
+                            Page, result.error or result.status_code))
+                records = result.records
+                if self.incremental:
+                    page_stats = PipelineStats(status_names)
+                    for item in records:
+                        page_stats.add(item, **self.fields)
+                else:
+                    page_stats = None
+                    for item in records:
+                        stats.add(item, **self.fields)
+                full = len(records) >= self.NumRows
+                self.pages_aggregated += 1
+
+            if page_stats is not None:
+                pages.append((digest, page_stats, full))
+                stats.merge(page_stats)
+
+            if not full:
+                break
+            Page += 1
+
+        self.__pages = pages
+        self.__status_names = status_names
+        self.stats = stats
+        return stats
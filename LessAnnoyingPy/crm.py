@@ -1,6 +1,68 @@
+import gzip
 import requests
 import json
 
+from LessAnnoyingPy.results import (Result, ContactResult, SearchPage,
+                                    PipelineReportPage, PipelineItemsResult,
+                                    PipelineSettingsResult, CustomFieldsResult)
+from LessAnnoyingPy.validation import ValidationError
+from LessAnnoyingPy import _json
+
+
+class TransferStats:
+    """Byte counters for the requests made by a LACRM instance
+
+    The attempt whose response is returned is counted in the main
+    counters. When a gzip request is resent uncompressed, the bytes the
+    discarded gzip attempt sent and received are counted in bytes_wasted.
+
+    Received sizes come from urllib3, which cannot report the wire size of
+    chunked responses. Those are counted at their decoded size, so savings
+    are never overstated
+
+    Attributes
+    ----------
+    requests : int
+        Number of requests counted
+    compressed_requests : int
+        Number of requests sent with a gzip body
+    fallbacks : int
+        Number of gzip requests that were resent uncompressed
+    bytes_encoded : int
+        Size of the JSON request bodies before compression
+    bytes_sent : int
+        Size of the request bodies as sent
+    bytes_received : int
+        Size of the response bodies as read off the wire, before
+        decompression
+    bytes_decoded : int
+        Size of the response bodies after decompression
+    bytes_wasted : int
+        Bytes sent and received by gzip attempts that were resent
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.compressed_requests = 0
+        self.fallbacks = 0
+        self.bytes_encoded = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.bytes_decoded = 0
+        self.bytes_wasted = 0
+
+    @property
+    def bytes_saved(self):
+        """Bytes that compression kept off the wire in both directions,
+        less the bytes wasted on gzip attempts that were resent"""
+        return (self.bytes_encoded - self.bytes_sent
+                + self.bytes_decoded - self.bytes_received - self.bytes_wasted)
+
+    def __str__(self):
+        return ('{} requests, {} of {} bytes sent, {} of {} bytes received'
+                .format(self.requests, self.bytes_sent, self.bytes_encoded,
+                        self.bytes_received, self.bytes_decoded))
+
 
 class LACRM:
     """API connecter for Less Annoying CRM
@@ -20,7 +82,8 @@ class LACRM:
     """
 
     def __init__(self, token_location='config.json',
-                 url="https://api.lessannoyingcrm.com"):
+                 url="https://api.lessannoyingcrm.com", validator=None,
+                 compress_requests=False, compress_threshold=1024):
         """
         Parameters
         ----------
@@ -28,6 +91,18 @@ class LACRM:
             Location of token file used to authenticate with LACRM API
         url : str, optional
             LACRM API endpoint
+        validator : LessAnnoyingPy.validation.Validator, optional
+            When set, every payload is validated locally before it is sent
+            and a ValidationError is raised instead of making the request
+        compress_requests : bool, optional
+            Gzip request bodies larger than compress_threshold. A gzip
+            request answered with 415 Unsupported Media Type is resent
+            uncompressed and compression is turned off. Until a gzip request
+            has been answered with JSON, a reply that is not JSON is also
+            resent uncompressed, and compression is turned off if the plain
+            reply is JSON. API errors (Success false) are never resent
+        compress_threshold : int, optional
+            Smallest encoded body, in bytes, that gets compressed
 
         Returns
         -------
@@ -36,6 +111,11 @@ class LACRM:
         """
         self.__URL = url
         self.__TOKENLOCATION = token_location
+        self.validator = validator
+        self.compress_requests = compress_requests
+        self.compress_threshold = compress_threshold
+        self.transfer_stats = TransferStats()
+        self.__gzip_accepted = False
         self.__set_tokens()
 
     def __set_tokens(self):
@@ -59,6 +139,69 @@ class LACRM:
 
         return parameters
 
+    def __post(self, parameters, result=Result, **kwargs):
+        if self.validator is not None:
+            errors = self.validator.validate(parameters['Function'], parameters)
+            if errors:
+                raise ValidationError(errors)
+
+        body = _json.dumps(parameters)
+
+        if self.compress_requests and len(body) >= self.compress_threshold:
+            compressed = gzip.compress(body)
+            response, received = self.__send(compressed,
+                                             {'Content-Encoding': 'gzip'})
+            answer = result(response, **kwargs)
+            gzip_rejected = response.status_code == 415
+            if not gzip_rejected and (self.__gzip_accepted
+                                      or self.__is_json(answer)):
+                self.__gzip_accepted = True
+                self.__count(len(body), len(compressed), response, received,
+                             True)
+                return answer
+
+            # The server rejected or could not read the gzip body
+            stats = self.transfer_stats
+            stats.fallbacks += 1
+            stats.bytes_wasted += len(compressed) + received
+            response, received = self.__send(body)
+            answer = result(response, **kwargs)
+            if gzip_rejected or self.__is_json(answer):
+                self.compress_requests = False
+            self.__count(len(body), len(body), response, received, False)
+            return answer
+
+        response, received = self.__send(body)
+        self.__count(len(body), len(body), response, received, False)
+        return result(response, **kwargs)
+
+    @staticmethod
+    def __is_json(answer):
+        try:
+            return answer.data is not None
+        except ValueError:
+            return False
+
+    def __send(self, body, headers=None):
+        response = requests.post(
+            self.__URL, data=body,
+            headers=dict({'Content-Type': 'application/json'}, **(headers or {})))
+
+        content = response.content
+        # urllib3 reports the bytes read off the socket, before decoding.
+        # It reports 0 for chunked responses, which are counted as decoded
+        received = response.raw.tell() if response.raw is not None else 0
+        return response, received or len(content)
+
+    def __count(self, encoded, sent, response, received, compressed):
+        stats = self.transfer_stats
+        stats.requests += 1
+        stats.compressed_requests += compressed
+        stats.bytes_encoded += encoded
+        stats.bytes_sent += sent
+        stats.bytes_received += received
+        stats.bytes_decoded += len(response.content)
+
     def create_contact(self, contact):
         """Add a new contact or company to CRM
 
@@ -69,7 +212,7 @@ class LACRM:
 
         Returns
         -------
-        requests.models.Response
+        LessAnnoyingPy.results.ContactResult
             Results form the API request
         """
 
@@ -77,7 +220,7 @@ class LACRM:
 
         self.__add_api_function(parameters, 'CreateContact')
 
-        return requests.post(self.__URL, json=parameters)
+        return self.__post(parameters, ContactResult)
 
     def get_contact(self, ContactId):
         """Use to retrieve a contact's information
@@ -89,7 +232,7 @@ class LACRM:
 
         Returns
         -------
-        requests.models.Response
+        LessAnnoyingPy.results.ContactResult
             Results form the API request
         """
 
@@ -97,7 +240,7 @@ class LACRM:
 
         self.__add_api_function(parameters, 'GetContact')
 
-        return requests.post(self.__URL, json=parameters)
+        return self.__post(parameters, ContactResult)
 
     def edit_contact(self, contact):
         """Use to edit an existing contact
@@ -110,7 +253,7 @@ class LACRM:
 
         Returns
         -------
-        requests.models.Response
+        LessAnnoyingPy.results.ContactResult
             Results form the API request
         """
 
@@ -118,7 +261,7 @@ class LACRM:
 
         self.__add_api_function(parameters, 'EditContact')
 
-        return requests.post(self.__URL, json=parameters)
+        return self.__post(parameters, ContactResult)
 
     def delete_contact(self, ContactId):
         """Use to remove contacts
@@ -131,7 +274,7 @@ class LACRM:
 
         Returns
         -------
-        requests.models.Response
+        LessAnnoyingPy.results.Result
             Results form the API request
         """
 
@@ -139,7 +282,7 @@ class LACRM:
 
         self.__add_api_function(parameters, 'DeleteContact')
 
-        return requests.post(self.__URL, json=parameters)
+        return self.__post(parameters, Result)
 
     def search_contacts(self, SearchTerms, Sort=None, NumRows=None, Page=None, RecordType=None):
         """Search for one or more contact(s)
@@ -161,7 +304,7 @@ class LACRM:
 
         Returns
         -------
-        requests.models.Response
+        LessAnnoyingPy.results.SearchPage
             Request results
         """
 
@@ -169,7 +312,7 @@ class LACRM:
 
         self.__add_api_function(parameters, 'SearchContacts')
 
-        return requests.post(self.__URL, json=parameters)
+        return self.__post(parameters, SearchPage, Page=Page, NumRows=NumRows)
 
     def create_note(self, ContactId, Note):
         """Use to add a note to a contact's history
@@ -183,7 +326,7 @@ class LACRM:
 
         Returns
         -------
-        requests.models.Response
+        LessAnnoyingPy.results.Result
             Requests results
         """
 
@@ -191,7 +334,7 @@ class LACRM:
 
         self.__add_api_function(parameters, 'CreateNote')
 
-        return requests.post(self.__URL, json=parameters)
+        return self.__post(parameters, Result)
 
     def create_task(self, DueDate, Name, Description=None, ContactId=None,
                     AssignedTo=None):
@@ -214,7 +357,7 @@ class LACRM:
 
         Returns
         -------
-        requests.models.Response
+        LessAnnoyingPy.results.Result
             Request results
         """
 
@@ -222,7 +365,7 @@ class LACRM:
 
         self.__add_api_function(parameters, 'CreateTask')
 
-        return requests.post(self.__URL, json=parameters)
+        return self.__post(parameters, Result)
 
     def create_event(self, Date, Name, StartTime, EndTime, Description=None,
                      Contacts=None, Users=None):
@@ -253,7 +396,7 @@ class LACRM:
 
         Returns
         -------
-        requests.models.Response
+        LessAnnoyingPy.results.Result
             Request results
         """
 
@@ -261,7 +404,7 @@ class LACRM:
 
         self.__add_api_function(parameters, 'CreateEvent')
 
-        return requests.post(self.__URL, json=parameters)
+        return self.__post(parameters, Result)
 
     def add_contact_to_group(self, ContactId, GroupName):
         """Use to add a contact to one of the groups in your CRM. Before calling
@@ -277,7 +420,7 @@ class LACRM:
 
         Returns
         -------
-        requests.models.Response
+        LessAnnoyingPy.results.Result
             Request results
         """
 
@@ -285,7 +428,7 @@ class LACRM:
 
         self.__add_api_function(parameters, 'AddContactToGroup')
 
-        return requests.post(self.__URL, json=parameters)
+        return self.__post(parameters, Result)
 
     def create_pipeline(self, ContactId, PipelineId, StatusId, Priority=None, CustomFields=None, Note=None):
         """Use to attach a new pipeline to a contact or company in your CRM
@@ -311,7 +454,7 @@ class LACRM:
 
         Returns
         -------
-        requests.models.Response
+        LessAnnoyingPy.results.Result
             Request results
         """
 
@@ -319,7 +462,7 @@ class LACRM:
 
         self.__add_api_function(parameters, 'CreatePipeline')
 
-        return requests.post(self.__URL, json=parameters)
+        return self.__post(parameters, Result)
 
     def get_pipeline_items_attached_to_contact(self, ContactId):
         """The GetPipelineItemsAttachedToContact function is used to retrieve a
@@ -340,7 +483,7 @@ class LACRM:
 
         Returns
         -------
-        requests.models.Response
+        LessAnnoyingPy.results.PipelineItemsResult
             Request results
         """
 
@@ -349,7 +492,7 @@ class LACRM:
         self.__add_api_function(
             parameters, 'GetPipelineItemsAttachedToContact')
 
-        return requests.post(self.__URL, json=parameters)
+        return self.__post(parameters, PipelineItemsResult)
 
     def update_pipeline_item(self, PipelineItemId, StatusId, Priority=None,
                              CustomFields=None, Note=None):
@@ -377,7 +520,7 @@ class LACRM:
 
         Returns
         -------
-        requests.models.Response
+        LessAnnoyingPy.results.Result
             Request results
         """
 
@@ -385,7 +528,7 @@ class LACRM:
 
         self.__add_api_function(parameters, 'UpdatePipelineItem')
 
-        return requests.post(self.__URL, json=parameters)
+        return self.__post(parameters, Result)
 
     def get_pipeline_report(self, PipelineId, SortBy=None, NumRows=None, Page=None,
                             SortDirection=None, UserFilter=None, StatusFilter=None):
@@ -423,7 +566,7 @@ class LACRM:
 
         Returns
         -------
-        requests.models.Response
+        LessAnnoyingPy.results.PipelineReportPage
             Request results
         """
 
@@ -431,7 +574,7 @@ class LACRM:
 
         self.__add_api_function(parameters, 'GetPipelineReport')
 
-        return requests.post(self.__URL, json=parameters)
+        return self.__post(parameters, PipelineReportPage, Page=Page, NumRows=NumRows)
 
     def get_pipeline_settings(self):
         """The GetPipelineSettings function will return a list of all of your
@@ -447,7 +590,7 @@ class LACRM:
 
         Returns
         -------
-        requests.models.Response
+        LessAnnoyingPy.results.PipelineSettingsResult
             Request results
         """
 
@@ -455,14 +598,14 @@ class LACRM:
 
         self.__add_api_function(parameters, 'GetPipelineSettings')
 
-        return requests.post(self.__URL, json=parameters)
+        return self.__post(parameters, PipelineSettingsResult)
 
     def get_user_info(self):
         """Retrieve meta information about your CRM account
 
         Returns
         -------
-        requests.models.Response
+        LessAnnoyingPy.results.Result
             Request results
         """
 
@@ -470,7 +613,7 @@ class LACRM:
 
         self.__add_api_function(parameters, 'GetUserInfo')
 
-        return requests.post(self.__URL, json=parameters)
+        return self.__post(parameters, Result)
 
     def get_custom_fields(self):
         """Retrieve a list of all the custom contact/company
@@ -478,7 +621,7 @@ class LACRM:
 
         Returns
         -------
-        requests.models.Response
+        LessAnnoyingPy.results.CustomFieldsResult
             Request results
         """
 
@@ -486,7 +629,7 @@ class LACRM:
 
         self.__add_api_function(parameters, 'GetCustomFields')
 
-        return requests.post(self.__URL, json=parameters)
+        return self.__post(parameters, CustomFieldsResult)
 
 
 class Contact:
@@ -0,0 +1,372 @@
+"""
+Change-detection feed for contacts and pipeline items
+
+One ChangeFeed polls the CRM and hands created, updated and deleted events
+to every subscriber, so several services can share a single polling loop
+
+Classes
+-------
+ChangeFeed(crm, SearchTerms="", NumRows=500, track_pipelines=True,
+           min_interval=30, max_interval=900, full_scan_every=10)
+    Polls the CRM and emits change events
+ChangeEvent(kind, record_type, record_id, ContactId, record)
+    A single change to a contact or pipeline item
+JsonLinesSink(path)
+    Subscriber that appends events to a file as JSON lines
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+ChangeEvent = namedtuple('ChangeEvent', ['kind', 'record_type', 'record_id',
+                                         'ContactId', 'record'])
+
+CREATED = 'created'
+UPDATED = 'updated'
+DELETED = 'deleted'
+
+
+def _digest(record):
+    return hashlib.sha1(json.dumps(record, sort_keys=True,
+                                   default=str).encode('utf-8')).digest()
+
+
+class JsonLinesSink:
+    """Subscriber that appends events to a file as JSON lines
+
+    Methods
+    -------
+    close()
+        Close the file
+    """
+
+    def __init__(self, path):
+        """
+        Parameters
+        ----------
+        path : str
+            File the events are appended to
+
+        Returns
+        -------
+        JsonLinesSink
+            JsonLinesSink instance
+        """
+        self.__file = open(path, 'a', encoding='utf-8')
+        self.__lock = threading.Lock()
+
+    def __call__(self, event):
+        line = json.dumps(event._asdict(), default=str)
+        with self.__lock:
+            self.__file.write(line + '\n')
+            self.__file.flush()
+
+    def close(self):
+        """Close the file"""
+        self.__file.close()
+
+
+class ChangeFeed:
+    """Polls the CRM and emits change events
+
+    Contacts are read with search_contacts sorted by DateEdited, and
+    pipeline items with get_pipeline_report for every pipeline returned by
+    get_pipeline_settings, sorted by DateNote in descending order. Between
+    full scans, paging stops at the first page that holds no record newer
+    than the last high-water mark. Every full_scan_every polls all pages are
+    read so deleted records can be detected. A content hash is kept per
+    record, so an event is only emitted when the record really changed.
+
+    search_contacts takes no sort direction, and the API is expected to
+    return the most recently edited contacts first. Early stopping only
+    happens on pages whose dates are in descending order, so a page sorted
+    the other way is never used to cut the scan short.
+
+    If any call of a poll fails, the poll raises RuntimeError before
+    emitting events or updating the tracked state, so a failed request
+    never shows up as deleted records.
+
+    The polling interval halves after a poll that found changes and doubles
+    after one that did not, staying between min_interval and max_interval
+
+    Attributes
+    ----------
+    interval : float
+        Seconds run() waits before the next poll
+    high_water : str
+        Latest DateEdited seen
+
+    Methods
+    -------
+    subscribe(callback)
+        Register a callable that receives every ChangeEvent
+    unsubscribe(callback)
+        Remove a registered callable
+    poll()
+        Check the CRM once and emit the changes found
+    run(stop_event=None)
+        Poll until stop_event is set
+    """
+
+    def __init__(self, crm, SearchTerms="", NumRows=500, track_pipelines=True,
+                 min_interval=30, max_interval=900, full_scan_every=10,
+                 emit_initial=False, date_field='DateEdited',
+                 pipeline_date_field='DateNote'):
+        """
+        Parameters
+        ----------
+        crm : LACRM
+            CRM instance to poll
+        SearchTerms : str, optional
+            Passed to search_contacts. The default matches every contact
+        NumRows : int, optional
+            Rows fetched per page, between 1 and 500
+        track_pipelines : bool, optional
+            Also emit events for pipeline items
+        min_interval : float, optional
+            Shortest wait between polls, in seconds
+        max_interval : float, optional
+            Longest wait between polls, in seconds
+        full_scan_every : int, optional
+            Number of polls between full scans, which detect deletions
+        emit_initial : bool, optional
+            Emit created events for the records found by the first poll.
+            By default the first poll only records the current state
+        date_field : str, optional
+            Key of the contact rows holding the date they were last edited
+        pipeline_date_field : str, optional
+            Key of the pipeline report rows holding the date of their last
+            update
+
+        Returns
+        -------
+        ChangeFeed
+            ChangeFeed instance
+        """
+        if min_interval <= 0 or max_interval < min_interval:
+            raise ValueError("Need 0 < min_interval <= max_interval")
+        if full_scan_every < 1:
+            raise ValueError("full_scan_every must be at least 1")
+
+        self.crm = crm
+        self.SearchTerms = SearchTerms
+        self.NumRows = NumRows
+        self.track_pipelines = track_pipelines
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.full_scan_every = full_scan_every
+        self.emit_initial = emit_initial
+        self.date_field = date_field
+        self.pipeline_date_field = pipeline_date_field
+
+        self.interval = min_interval
+        self.high_water = None
+        self.polls = 0
+
+        self.__subscribers = []
+        self.__contacts = {}
+        self.__pipelines = None
+        self.__pipeline_items = {}
+        self.__pipeline_high_water = {}
+
+    def subscribe(self, callback):
+        """Register a callable that receives every ChangeEvent
+
+        A queue.Queue can be subscribed with feed.subscribe(queue.put)
+
+        Parameters
+        ----------
+        callback : callable
+            Called with one ChangeEvent at a time
+        """
+
+        self.__subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        """Remove a registered callable
+
+        Parameters
+        ----------
+        callback : callable
+            Callable passed to subscribe
+        """
+
+        self.__subscribers.remove(callback)
+
+    def poll(self):
+        """Check the CRM once and emit the changes found
+
+        Returns
+        -------
+        list of ChangeEvent
+            Events emitted by this poll
+
+        Raises
+        ------
+        RuntimeError
+            When a call to the CRM fails. Nothing is emitted and the tracked
+            state is left unchanged
+        """
+
+        initial = self.polls == 0
+        full_scan = initial or self.polls % self.full_scan_every == 0
+
+        contacts, high_water, events = self.__scan(
+            lambda Page: self.crm.search_contacts(
+                self.SearchTerms, Sort='DateEdited', NumRows=self.NumRows,
+                Page=Page),
+            'contact', 'ContactId', self.date_field, self.__contacts,
+            self.high_water, full_scan)
+
+        if self.track_pipelines:
+            pipelines = self.__pipelines
+            if full_scan or pipelines is None:
+                pipelines = self.__get_pipelines()
+
+            pipeline_items = {}
+            pipeline_high_water = {}
+            for pipeline_id in pipelines:
+                pipeline_items[pipeline_id], pipeline_high_water[pipeline_id], \
+                    pipeline_events = self.__scan_pipeline(pipeline_id,
+                                                           full_scan)
+                events.extend(pipeline_events)
+
+            if full_scan:
+                for pipeline_id in set(self.__pipeline_items) - set(pipelines):
+                    for item_id, (_, contact_id) in \
+                            self.__pipeline_items[pipeline_id].items():
+                        events.append(ChangeEvent(DELETED, 'pipeline_item',
+                                                  item_id, contact_id, None))
+
+            # Every call succeeded, so the new state can replace the old one
+            self.__pipelines = pipelines
+            self.__pipeline_items = pipeline_items
+            self.__pipeline_high_water = pipeline_high_water
+
+        self.__contacts = contacts
+        self.high_water = high_water
+        self.polls += 1
+
+        if initial and not self.emit_initial:
+            events = []
+
+        for event in events:
+            self.__emit(event)
+
+        if events:
+            self.interval = max(self.min_interval, self.interval / 2)
+        else:
+            self.interval = min(self.max_interval, self.interval * 2)
+
+        return events
+
+    def run(self, stop_event=None):
+        """Poll until stop_event is set
+
+        Parameters
+        ----------
+        stop_event : threading.Event, optional
+            Set it to stop the loop. Runs forever when left out
+        """
+
+        if stop_event is None:
+            stop_event = threading.Event()
+
+        while not stop_event.is_set():
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("ChangeFeed poll failed")
+                self.interval = min(self.max_interval, self.interval * 2)
+            stop_event.wait(self.interval)
+
+    def __emit(self, event):
+        for callback in list(self.__subscribers):
+            try:
+                callback(event)
+            except Exception:
+                logger.exception("ChangeFeed subscriber %r failed", callback)
+
+    def __get_pipelines(self):
+        settings = self.crm.get_pipeline_settings()
+        if not settings.success:
+            raise RuntimeError('GetPipelineSettings failed: {}'.format(
+                settings.error or settings.status_code))
+        return [pipeline.get('PipelineId') for pipeline in settings.records]
+
+    def __scan_pipeline(self, PipelineId, full_scan):
+        return self.__scan(
+            lambda Page: self.crm.get_pipeline_report(
+                PipelineId, SortBy='DateNote', NumRows=self.NumRows, Page=Page,
+                SortDirection='DESC', StatusFilter='all'),
+            'pipeline_item', 'PipelineItemId', self.pipeline_date_field,
+            self.__pipeline_items.get(PipelineId, {}),
+            self.__pipeline_high_water.get(PipelineId), full_scan)
+
+    def __scan(self, fetch, record_type, id_field, date_field, known,
+               high_water, full_scan):
+        # Works on copies so a failed call leaves the tracked state intact
+        state = dict(known)
+        since = None if full_scan else high_water
+        seen = set()
+        events = []
+
+        Page = 1
+        while True:
+            page = fetch(Page)
+            if not page.success:
+                raise RuntimeError('Fetching {}s failed on page {}: {}'.format(
+                    record_type, Page, page.error or page.status_code))
+
+            records = page.records
+            dates = [item.get(date_field) for item in records]
+            known_dates = [i for i in dates if i is not None]
+            descending = all(a >= b for a, b in zip(known_dates,
+                                                   known_dates[1:]))
+            newer = False
+
+            for item, edited in zip(records, dates):
+                if since is not None and edited is not None and edited < since:
+                    continue
+                newer = True
+
+                record = item.to_dict()
+                record_id = record.get(id_field)
+                contact_id = record.get('ContactId')
+                seen.add(record_id)
+                digest = _digest(record)
+                previous = state.get(record_id)
+                state[record_id] = (digest, contact_id)
+
+                if edited is not None and (high_water is None
+                                           or edited > high_water):
+                    high_water = edited
+
+                if previous is None:
+                    kind = CREATED
+                elif previous[0] != digest:
+                    kind = UPDATED
+                else:
+                    continue
+                events.append(ChangeEvent(kind, record_type, record_id,
+                                          contact_id, record))
+
+            if len(records) < self.NumRows:
+                break
+            if not full_scan and descending and not newer:
+                break
+            Page += 1
+
+        # Only reached after every page was read successfully
+        if full_scan:
+            for record_id in set(state) - seen:
+                _, contact_id = state.pop(record_id)
+                events.append(ChangeEvent(DELETED, record_type, record_id,
+                                          contact_id, None))
+
+        return state, high_water, events
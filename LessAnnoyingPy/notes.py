@@ -0,0 +1,284 @@
+"""
+Opt-in coalescing writer for contact notes
+
+Classes
+-------
+NoteCoalescer(crm, max_delay=5.0, max_notes=50, separator="\\n",
+              timestamp_format="%Y-%m-%d %H:%M:%S")
+    Buffers notes per contact and sends them as one CreateNote call
+NoteFlushError(failures)
+    Raised when some buffered notes could not be sent
+"""
+
+import atexit
+import threading
+import time
+from datetime import datetime
+
+
+class NoteFlushError(Exception):
+    """Raised when some buffered notes could not be sent
+
+    The notes of every failed contact are put back in the buffer, so a
+    later flush() or close() tries them again
+
+    Attributes
+    ----------
+    failures : dict
+        Maps each ContactId whose notes could not be sent to the exception
+        raised while sending them
+    """
+
+    def __init__(self, failures):
+        self.failures = failures
+        super().__init__('Could not send notes for {} contact(s): {}'.format(
+            len(failures), ', '.join(
+                '{} ({})'.format(i, e) for i, e in failures.items())))
+
+
+class NoteCoalescer:
+    """Buffers notes per contact and sends them as one CreateNote call
+
+    Notes added for the same ContactId are held until either max_delay
+    seconds have passed since the first buffered note or max_notes notes
+    are waiting, then merged into a single note. Every buffered note is
+    flushed when close() is called, when the coalescer is used as a
+    context manager and exits, or when the interpreter shuts down. Notes
+    whose CreateNote call fails stay in the buffer and are sent again by
+    the next flush
+
+    Attributes
+    ----------
+    notes_received : int
+        Number of notes passed to add()
+    requests_sent : int
+        Number of CreateNote calls made, retries included
+    failed_requests : int
+        Number of CreateNote calls that raised or did not succeed
+    requests_succeeded : int
+        Number of CreateNote calls that succeeded
+    notes_delivered : int
+        Number of notes sent by the successful CreateNote calls
+
+    Methods
+    -------
+    add(ContactId, Note)
+        Buffer a note for a contact
+    flush(ContactId=None)
+        Send buffered notes now, for one contact or for all of them
+    close()
+        Flush every buffered note and stop the background thread
+    """
+
+    def __init__(self, crm, max_delay=5.0, max_notes=50, separator="\n",
+                 timestamp_format="%Y-%m-%d %H:%M:%S"):
+        """
+        Parameters
+        ----------
+        crm : LACRM
+            CRM instance used to send the merged notes
+        max_delay : float, optional
+            Seconds a note may wait in the buffer before its contact is flushed
+        max_notes : int, optional
+            Number of buffered notes for one contact that triggers a flush
+        separator : str, optional
+            Text placed between merged notes
+        timestamp_format : str, optional
+            strftime format used to prefix each note with the time it was
+            added. Pass None to leave notes without a timestamp
+
+        Returns
+        -------
+        NoteCoalescer
+            NoteCoalescer instance
+        """
+        if max_delay <= 0:
+            raise ValueError("max_delay must be greater than 0")
+        if max_notes < 1:
+            raise ValueError("max_notes must be at least 1")
+
+        self.crm = crm
+        self.max_delay = max_delay
+        self.max_notes = max_notes
+        self.separator = separator
+        self.timestamp_format = timestamp_format
+
+        self.notes_received = 0
+        self.requests_sent = 0
+        self.failed_requests = 0
+        self.requests_succeeded = 0
+        self.notes_delivered = 0
+
+        self.__buffers = {}
+        self.__deadlines = {}
+        self.__send_lock = threading.Lock()
+        self.__condition = threading.Condition()
+        self.__closed = False
+        self.__thread = threading.Thread(target=self.__run, daemon=True,
+                                         name='NoteCoalescer')
+        self.__thread.start()
+        atexit.register(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def reduction_ratio(self):
+        """Fraction of note calls saved by coalescing, between 0 and 1
+
+        Computed from delivered notes and successful calls only, so failed
+        attempts and retries do not affect it
+        """
+        if not self.notes_delivered:
+            return 0.0
+        return 1 - self.requests_succeeded / self.notes_delivered
+
+    @property
+    def pending(self):
+        """Number of notes waiting in the buffer"""
+        with self.__condition:
+            return sum(len(notes) for notes in self.__buffers.values())
+
+    def add(self, ContactId, Note):
+        """Buffer a note for a contact
+
+        Parameters
+        ----------
+        ContactId : str
+            Id of the contact
+        Note : str
+            Text that should appear in the note field
+
+        Raises
+        ------
+        NoteFlushError
+            When the note filled the buffer and the merged note could not be
+            sent. The notes stay buffered
+        """
+
+        if self.timestamp_format:
+            Note = '[{}] {}'.format(
+                datetime.now().strftime(self.timestamp_format), Note)
+
+        with self.__condition:
+            if self.__closed:
+                raise RuntimeError("NoteCoalescer is closed")
+
+            self.notes_received += 1
+            notes = self.__buffers.setdefault(ContactId, [])
+            notes.append(Note)
+            if len(notes) == 1:
+                self.__deadlines[ContactId] = time.monotonic() + self.max_delay
+
+            full = len(notes) >= self.max_notes
+            batch = self.__take(ContactId) if full else None
+            self.__condition.notify()
+
+        if batch:
+            self.__send_batches([(ContactId, batch)], raise_errors=True)
+
+    def flush(self, ContactId=None):
+        """Send buffered notes now
+
+        Parameters
+        ----------
+        ContactId : str, optional
+            Only flush this contact. Flushes every contact when left out
+
+        Raises
+        ------
+        NoteFlushError
+            When the notes of one or more contacts could not be sent. Every
+            other contact has still been tried
+        """
+
+        with self.__condition:
+            if ContactId is None:
+                batches = [(i, self.__take(i)) for i in list(self.__buffers)]
+            else:
+                batches = [(ContactId, self.__take(ContactId))]
+
+        self.__send_batches([i for i in batches if i[1]], raise_errors=True)
+
+    def close(self):
+        """Flush every buffered note and stop the background thread
+
+        Calling close() again after a NoteFlushError retries the notes that
+        are still buffered
+
+        Raises
+        ------
+        NoteFlushError
+            When the notes of one or more contacts could not be sent
+        """
+
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify()
+
+        self.__thread.join()
+        self.flush()
+        atexit.unregister(self.close)
+
+    def __take(self, ContactId):
+        self.__deadlines.pop(ContactId, None)
+        return self.__buffers.pop(ContactId, None)
+
+    def __requeue(self, ContactId, notes):
+        with self.__condition:
+            self.__buffers[ContactId] = notes + self.__buffers.get(ContactId, [])
+            self.__deadlines.setdefault(ContactId,
+                                        time.monotonic() + self.max_delay)
+            self.__condition.notify()
+
+    def __send(self, ContactId, notes):
+        with self.__send_lock:
+            self.requests_sent += 1
+            try:
+                result = self.crm.create_note(ContactId,
+                                              self.separator.join(notes))
+                if not result.success:
+                    raise RuntimeError('CreateNote failed: {}'.format(
+                        result.error or result.status_code))
+            except Exception:
+                self.failed_requests += 1
+                raise
+            self.requests_succeeded += 1
+            self.notes_delivered += len(notes)
+
+    def __send_batches(self, batches, raise_errors=False):
+        failures = {}
+        for contact_id, notes in batches:
+            try:
+                self.__send(contact_id, notes)
+            except Exception as e:
+                failures[contact_id] = e
+                self.__requeue(contact_id, notes)
+
+        if failures and raise_errors:
+            raise NoteFlushError(failures)
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                if self.__closed:
+                    return
+
+                now = time.monotonic()
+                due = [i for i, deadline in self.__deadlines.items()
+                       if deadline <= now]
+                batches = [(i, self.__take(i)) for i in due]
+
+                if not batches:
+                    timeout = None
+                    if self.__deadlines:
+                        timeout = min(self.__deadlines.values()) - now
+                    self.__condition.wait(timeout)
+                    continue
+
+            # Failed batches are put back in the buffer and retried once
+            # their new deadline passes
+            self.__send_batches(batches)
@@ -0,0 +1,360 @@
+"""
+Typed result objects returned by the LACRM class
+
+The body of a response is decoded once, the first time it is needed, and
+records are exposed as read-only views over the decoded data rather than
+copies of it. The original requests.models.Response is always available
+through the response attribute
+
+Classes
+-------
+Result(response)
+    Generic API result
+ContactResult(response)
+    Result of CreateContact, GetContact and EditContact
+SearchPage(response, Page=None, NumRows=None)
+    One page of SearchContacts results
+PipelineReportPage(response, Page=None, NumRows=None)
+    One page of GetPipelineReport results
+PipelineItemsResult(response)
+    Result of GetPipelineItemsAttachedToContact
+PipelineSettingsResult(response)
+    Result of GetPipelineSettings
+CustomFieldsResult(response)
+    Result of GetCustomFields
+RecordView(record)
+    Read-only view over a single decoded record
+RecordList(records)
+    Read-only, lazily wrapping view over a list of decoded records
+"""
+
+from collections.abc import Mapping, Sequence
+
+from LessAnnoyingPy import _json
+
+_UNSET = object()
+
+
+def _wrap(value):
+    if isinstance(value, dict):
+        return RecordView(value)
+    if isinstance(value, list):
+        return RecordList(value)
+    return value
+
+
+class RecordView(Mapping):
+    """Read-only view over a single decoded record
+
+    Values can be read with either item or attribute access. Nested
+    dictionaries and lists are wrapped in views as they are accessed
+
+    Methods
+    -------
+    to_dict()
+        Return a shallow copy of the underlying record
+    """
+
+    __slots__ = ('_record',)
+
+    def __init__(self, record):
+        """
+        Parameters
+        ----------
+        record : dict
+            Decoded record to expose
+
+        Returns
+        -------
+        RecordView
+            RecordView instance
+        """
+        self._record = record
+
+    def __getitem__(self, key):
+        return _wrap(self._record[key])
+
+    def __getattr__(self, key):
+        if key.startswith('_'):
+            raise AttributeError(key)
+        try:
+            return _wrap(self._record[key])
+        except KeyError:
+            raise AttributeError(key) from None
+
+    def __iter__(self):
+        return iter(self._record)
+
+    def __len__(self):
+        return len(self._record)
+
+    def __repr__(self):
+        return 'RecordView({!r})'.format(self._record)
+
+    def to_dict(self):
+        """Return a shallow copy of the underlying record
+
+        Returns
+        -------
+        dict
+            Copy of the record
+        """
+
+        return dict(self._record)
+
+
+class RecordList(Sequence):
+    """Read-only view over a list of decoded records
+
+    Items are wrapped in a RecordView only when they are accessed
+    """
+
+    __slots__ = ('_records',)
+
+    def __init__(self, records):
+        """
+        Parameters
+        ----------
+        records : list
+            Decoded list of records
+
+        Returns
+        -------
+        RecordList
+            RecordList instance
+        """
+        self._records = records
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return RecordList(self._records[index])
+        return _wrap(self._records[index])
+
+    def __len__(self):
+        return len(self._records)
+
+    def __repr__(self):
+        return 'RecordList({!r})'.format(self._records)
+
+
+class Result:
+    """Generic API result
+
+    Attributes that are not defined here, such as json(), raise_for_status(),
+    url and reason, are read from the raw response. Like a response, a
+    result is true when its status code is below 400
+
+    Item access, `in` and iteration work on the keys of the decoded body
+
+    Attributes
+    ----------
+    response : requests.models.Response
+        Raw response returned by requests
+
+    Methods
+    -------
+    get(key, default=None)
+        Read a top level value from the decoded body
+    """
+
+    def __init__(self, response):
+        """
+        Parameters
+        ----------
+        response : requests.models.Response
+            Raw response returned by requests
+
+        Returns
+        -------
+        Result
+            Result instance
+        """
+        self.response = response
+        self._data = _UNSET
+
+    def __getattr__(self, key):
+        if key.startswith('_') or key == 'response':
+            raise AttributeError(key)
+        return getattr(self.response, key)
+
+    def __bool__(self):
+        return self.ok
+
+    @property
+    def data(self):
+        """Decoded body of the response, decoded on first access"""
+        if self._data is _UNSET:
+            content = self.response.content
+            self._data = _json.loads(content) if content else None
+        return self._data
+
+    @property
+    def status_code(self):
+        return self.response.status_code
+
+    @property
+    def ok(self):
+        return self.response.ok
+
+    @property
+    def text(self):
+        return self.response.text
+
+    @property
+    def content(self):
+        return self.response.content
+
+    @property
+    def headers(self):
+        return self.response.headers
+
+    def __decoded_dict(self):
+        try:
+            data = self.data
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+
+    @property
+    def success(self):
+        """Value of the Success flag the API sends with every response.
+        False when the body is not JSON"""
+        data = self.__decoded_dict()
+        return bool(data and data.get('Success'))
+
+    @property
+    def error(self):
+        """Error message sent by the API, if any"""
+        data = self.__decoded_dict()
+        return data.get('Error') if data else None
+
+    def __getitem__(self, key):
+        return _wrap(self.data[key])
+
+    def __contains__(self, key):
+        data = self.data
+        return isinstance(data, dict) and key in data
+
+    def __iter__(self):
+        data = self.data
+        return iter(data if isinstance(data, dict) else ())
+
+    def get(self, key, default=None):
+        """Read a top level value from the decoded body
+
+        Parameters
+        ----------
+        key : str
+            Name of the value
+        default : object, optional
+            Returned when the value is not present
+
+        Returns
+        -------
+        object
+            The value, wrapped in a view if it is a record or a list
+        """
+
+        data = self.data
+        if not isinstance(data, dict) or key not in data:
+            return default
+        return _wrap(data[key])
+
+    def __repr__(self):
+        return '<{} [{}]>'.format(type(self).__name__, self.status_code)
+
+
+class ContactResult(Result):
+    """Result of CreateContact, GetContact and EditContact"""
+
+    @property
+    def ContactId(self):
+        contact = self.contact
+        return contact.get('ContactId') if contact is not None else None
+
+    @property
+    def CompanyId(self):
+        contact = self.contact
+        return contact.get('CompanyId') if contact is not None else None
+
+    @property
+    def contact(self):
+        """Contact record as a RecordView"""
+        data = self.data
+        if not isinstance(data, dict):
+            return None
+        return RecordView(data.get('Contact', data))
+
+
+class ListResult(Result):
+    """Result whose body holds a list of records under the Result key
+
+    Iterating and len() work on the records rather than the body keys
+    """
+
+    _records = None
+
+    @property
+    def records(self):
+        """Records of the response as a RecordList"""
+        if self._records is None:
+            data = self.data
+            records = data.get('Result') if isinstance(data, dict) else data
+            if isinstance(records, dict):
+                records = list(records.values())
+            self._records = RecordList(records or [])
+        return self._records
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+
+class _Page(ListResult):
+
+    def __init__(self, response, Page=None, NumRows=None):
+        """
+        Parameters
+        ----------
+        response : requests.models.Response
+            Raw response returned by requests
+        Page : int, optional
+            Page that was requested
+        NumRows : int, optional
+            Number of rows that were requested
+
+        Returns
+        -------
+        Result
+            Result instance
+        """
+        super().__init__(response)
+        self.Page = Page or 1
+        self.NumRows = NumRows
+
+    @property
+    def has_more(self):
+        """True when the page is full and a following page may exist"""
+        return self.NumRows is not None and len(self.records) >= self.NumRows
+
+
+class SearchPage(_Page):
+    """One page of SearchContacts results"""
+
+
+class PipelineReportPage(_Page):
+    """One page of GetPipelineReport results"""
+
+
+class PipelineItemsResult(ListResult):
+    """Result of GetPipelineItemsAttachedToContact"""
+
+
+class PipelineSettingsResult(ListResult):
+    """Result of GetPipelineSettings"""
+
+
+class CustomFieldsResult(ListResult):
+    """Result of GetCustomFields"""
@@ -0,0 +1,353 @@
+"""
+Local payload validation for LACRM calls
+
+Payloads are checked before they are sent so requests the server would
+reject never use up any of the account's rate limit. Checks against the
+account's custom fields and pipelines use a schema compiled once from
+GetCustomFields and GetPipelineSettings
+
+Classes
+-------
+Validator(custom_fields=None, pipelines=None)
+    Checks payloads for LACRM functions
+ValidationError(errors)
+    Raised by LACRM when a payload fails validation
+FieldError(field, value, message)
+    A single problem found in a payload
+"""
+
+import re
+from collections import namedtuple
+from datetime import date
+
+FieldError = namedtuple('FieldError', ['field', 'value', 'message'])
+
+_DATE = re.compile(r'([0-9]{4})-([0-9]{2})-([0-9]{2})')
+_TIME = re.compile(r'([01][0-9]|2[0-3]):[0-5][0-9]')
+
+_SEARCH_SORTS = frozenset(('FirstName', 'LastName', 'DateEntered',
+                           'DateEdited', 'Relevance'))
+_REPORT_SORTS = frozenset(('Priority', 'DateNote', 'ContactName', 'Status'))
+_RECORD_TYPES = frozenset(('Contacts', 'Companies'))
+_SORT_DIRECTIONS = frozenset(('ASC', 'DESC'))
+
+
+class ValidationError(ValueError):
+    """Raised when a payload fails local validation
+
+    Attributes
+    ----------
+    errors : list of FieldError
+        Every problem found in the payload
+    """
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        super().__init__('; '.join(
+            '{}: {}'.format(e.field, e.message) for e in self.errors))
+
+
+class Validator:
+    """Checks payloads for LACRM functions
+
+    Static rules (Priority range, NumRows range, date and time formats,
+    group names) always apply. Custom field names, pipeline Ids and status
+    Ids are only checked once a schema has been loaded
+
+    Methods
+    -------
+    from_crm(crm)
+        Build a validator with the schema of a CRM account
+    refresh(crm)
+        Reload the schema from a CRM account
+    validate(function, parameters)
+        Return the problems found in one payload
+    validate_many(function, payloads)
+        Return the problems found in many payloads, by index
+    """
+
+    def __init__(self, custom_fields=None, pipelines=None):
+        """
+        Parameters
+        ----------
+        custom_fields : iterable of str, optional
+            Names and Ids of the account's contact custom fields
+        pipelines : dict, optional
+            Maps each PipelineId to a dict with the keys 'Statuses'
+            (iterable of StatusIds) and 'CustomFields' (iterable of field
+            names and Ids, or None when unknown)
+
+        Returns
+        -------
+        Validator
+            Validator instance
+        """
+        self.__load(custom_fields, pipelines)
+
+        self.__checks = {
+            'CreateContact': self.__check_contact,
+            'EditContact': self.__check_contact,
+            'SearchContacts': self.__check_search,
+            'CreateTask': self.__check_task,
+            'CreateEvent': self.__check_event,
+            'AddContactToGroup': self.__check_group,
+            'CreatePipeline': self.__check_create_pipeline,
+            'UpdatePipelineItem': self.__check_update_pipeline,
+            'GetPipelineReport': self.__check_report,
+        }
+
+    def __load(self, custom_fields, pipelines):
+        self.custom_fields = (frozenset(custom_fields)
+                              if custom_fields is not None else None)
+        self.pipelines = None
+        if pipelines is not None:
+            self.pipelines = {
+                str(pipeline_id): (
+                    frozenset(str(i) for i in info.get('Statuses', ())),
+                    frozenset(info['CustomFields'])
+                    if info.get('CustomFields') is not None else None)
+                for pipeline_id, info in pipelines.items()}
+
+    @classmethod
+    def from_crm(cls, crm):
+        """Build a validator with the schema of a CRM account
+
+        Parameters
+        ----------
+        crm : LACRM
+            CRM instance to read the schema from
+
+        Returns
+        -------
+        Validator
+            Validator instance
+        """
+
+        validator = cls()
+        validator.refresh(crm)
+        return validator
+
+    def refresh(self, crm):
+        """Reload the schema from a CRM account
+
+        Parameters
+        ----------
+        crm : LACRM
+            CRM instance to read the schema from
+
+        Raises
+        ------
+        RuntimeError
+            When either call fails. The previous schema is kept
+        """
+
+        custom_fields = crm.get_custom_fields()
+        settings = crm.get_pipeline_settings()
+        for function, result in (('GetCustomFields', custom_fields),
+                                 ('GetPipelineSettings', settings)):
+            if not result.success:
+                raise RuntimeError('Could not load schema, {} failed: {}'.format(
+                    function, result.error or result.status_code))
+
+        fields = set()
+        for field in custom_fields.records:
+            fields.update(str(field[key]) for key in ('FieldId', 'Name')
+                          if field.get(key) is not None)
+
+        pipelines = {}
+        for pipeline in settings.records:
+            statuses = [status.get('StatusId')
+                        for status in pipeline.get('Statuses') or ()]
+            custom_fields = None
+            if pipeline.get('CustomFields') is not None:
+                custom_fields = set()
+                for field in pipeline['CustomFields']:
+                    custom_fields.update(
+                        str(field[key]) for key in ('FieldId', 'Name')
+                        if field.get(key) is not None)
+            pipelines[pipeline['PipelineId']] = {
+                'Statuses': statuses, 'CustomFields': custom_fields}
+
+        self.__load(fields, pipelines)
+
+    def validate(self, function, parameters):
+        """Return the problems found in one payload
+
+        Parameters
+        ----------
+        function : str
+            LACRM function name, e.g. 'CreatePipeline'
+        parameters : dict
+            Payload that would be sent with the function
+
+        Returns
+        -------
+        list of FieldError
+            Empty when the payload is valid
+        """
+
+        check = self.__checks.get(function)
+        if check is None:
+            return []
+
+        errors = []
+        check(parameters, errors)
+        return errors
+
+    def validate_many(self, function, payloads):
+        """Return the problems found in many payloads
+
+        Parameters
+        ----------
+        function : str
+            LACRM function name, e.g. 'CreateContact'
+        payloads : iterable of dict
+            Payloads that would be sent with the function
+
+        Returns
+        -------
+        dict
+            Maps the index of every invalid payload to its list of FieldError
+        """
+
+        failures = {}
+        for index, parameters in enumerate(payloads):
+            errors = self.validate(function, parameters)
+            if errors:
+                failures[index] = errors
+        return failures
+
+    # Field rules
+
+    @staticmethod
+    def __check_range(parameters, field, low, high, errors):
+        value = parameters.get(field)
+        if value is None:
+            return
+        try:
+            number = int(value)
+        except (TypeError, ValueError):
+            number = None
+        if number is None or str(number) != str(value).strip() \
+                or number < low or (high is not None and number > high):
+            if high is None:
+                message = 'must be a whole number of at least {}'.format(low)
+            else:
+                message = 'must be a whole number between {} and {}'.format(
+                    low, high)
+            errors.append(FieldError(field, value, message))
+
+    @staticmethod
+    def __check_date(parameters, field, errors, required=False):
+        value = parameters.get(field)
+        if value is None:
+            if required:
+                errors.append(FieldError(field, value, 'is required'))
+            return
+        match = _DATE.fullmatch(value) if isinstance(value, str) else None
+        if match:
+            try:
+                date(*map(int, match.groups()))
+                return
+            except ValueError:
+                pass
+        errors.append(FieldError(field, value, 'must be a date as YYYY-MM-DD'))
+
+    @staticmethod
+    def __check_time(parameters, field, errors, required=False):
+        value = parameters.get(field)
+        if value is None:
+            if required:
+                errors.append(FieldError(field, value, 'is required'))
+            return
+        if not isinstance(value, str) or not _TIME.fullmatch(value):
+            errors.append(FieldError(
+                field, value, 'must be a 24 hour time as hh:mm'))
+
+    @staticmethod
+    def __check_choice(parameters, field, choices, errors):
+        value = parameters.get(field)
+        if value is not None and (not isinstance(value, str)
+                                  or value not in choices):
+            errors.append(FieldError(
+                field, value, 'must be one of {}'.format(
+                    ', '.join(sorted(choices)))))
+
+    @staticmethod
+    def __check_custom_fields(custom_fields, known, errors):
+        if not custom_fields or known is None:
+            return
+        if not isinstance(custom_fields, dict):
+            errors.append(FieldError('CustomFields', custom_fields,
+                                     'must be a dictionary'))
+            return
+        for key in custom_fields:
+            if str(key) not in known:
+                errors.append(FieldError('CustomFields.{}'.format(key), key,
+                                         'is not a known custom field'))
+
+    # Function rules
+
+    def __check_contact(self, parameters, errors):
+        self.__check_custom_fields(parameters.get('CustomFields'),
+                                   self.custom_fields, errors)
+
+    def __check_search(self, parameters, errors):
+        self.__check_range(parameters, 'NumRows', 1, 500, errors)
+        self.__check_range(parameters, 'Page', 1, None, errors)
+        self.__check_choice(parameters, 'Sort', _SEARCH_SORTS, errors)
+        self.__check_choice(parameters, 'RecordType', _RECORD_TYPES, errors)
+
+    def __check_task(self, parameters, errors):
+        self.__check_date(parameters, 'DueDate', errors, required=True)
+
+    def __check_event(self, parameters, errors):
+        self.__check_date(parameters, 'Date', errors, required=True)
+        self.__check_time(parameters, 'StartTime', errors, required=True)
+        self.__check_time(parameters, 'EndTime', errors, required=True)
+
+    def __check_group(self, parameters, errors):
+        name = parameters.get('GroupName')
+        if not name:
+            errors.append(FieldError('GroupName', name, 'is required'))
+        elif not isinstance(name, str):
+            errors.append(FieldError('GroupName', name, 'must be a string'))
+        elif ' ' in name:
+            errors.append(FieldError(
+                'GroupName', name,
+                'must not contain spaces, replace them with underscores (_)'))
+
+    def __check_create_pipeline(self, parameters, errors):
+        self.__check_range(parameters, 'Priority', 1, 3, errors)
+        if self.pipelines is None:
+            return
+
+        pipeline_id = parameters.get('PipelineId')
+        pipeline = self.pipelines.get(str(pipeline_id))
+        if pipeline is None:
+            errors.append(FieldError('PipelineId', pipeline_id,
+                                     'is not a known pipeline'))
+            return
+
+        statuses, custom_fields = pipeline
+        status_id = parameters.get('StatusId')
+        if str(status_id) not in statuses:
+            errors.append(FieldError('StatusId', status_id,
+                                     'is not a status of this pipeline'))
+        self.__check_custom_fields(parameters.get('CustomFields'),
+                                   custom_fields, errors)
+
+    def __check_update_pipeline(self, parameters, errors):
+        self.__check_range(parameters, 'Priority', 1, 3, errors)
+
+    def __check_report(self, parameters, errors):
+        self.__check_range(parameters, 'NumRows', 1, 500, errors)
+        self.__check_range(parameters, 'Page', 1, None, errors)
+        self.__check_choice(parameters, 'SortBy', _REPORT_SORTS, errors)
+        self.__check_choice(parameters, 'SortDirection', _SORT_DIRECTIONS,
+                            errors)
+        if self.pipelines is not None:
+            pipeline_id = parameters.get('PipelineId')
+            if str(pipeline_id) not in self.pipelines:
+                errors.append(FieldError('PipelineId', pipeline_id,
+                                         'is not a known pipeline'))
@@ -1,12 +1,18 @@
 from LessAnnoyingPy.crm import LACRM, Contact
+from LessAnnoyingPy.notes import NoteCoalescer
+from LessAnnoyingPy.analytics import PipelineAggregator
+from LessAnnoyingPy.feed import ChangeFeed
+from LessAnnoyingPy.validation import Validator, ValidationError
 import unittest
-import json
 
 location = input("Please Input Token Location>> ")
 crm = LACRM(location)
 test_data = crm.TOKENS['test-data']
 test_dummy = test_data['dummy-contact']
 test_contact = test_data['test-contact']
+test_pipeline = test_data['test-pipeline']
+pipeline_id = test_pipeline['test-pipeline-id']
+status_id = test_pipeline['test-status-id']
 
 dummy_contact = Contact(FullName=test_dummy['test-full-name'],
                         Email=test_dummy['test-email'], Phone=test_dummy['test-phone'],
@@ -25,8 +31,7 @@ class CRMTest(unittest.TestCase):
         create_result = crm.create_contact(dummy_contact)
         print("Create Contact Data: ", create_result.text,
               create_result, end="\n" * 2)
-        dummy_contact['ContactId'] = json.loads(
-            create_result.text)['ContactId']
+        dummy_contact['ContactId'] = create_result.ContactId
         self.assertEqual(create_result.status_code, 200)
 
         # Contact Deletion
@@ -61,6 +66,33 @@ class CRMTest(unittest.TestCase):
         print("Search Contact Data: ", search_result.text,
               search_result, end="\n" * 2)
         self.assertEqual(search_result.status_code, 200)
+        self.assertLessEqual(len(search_result.records), 1)
+
+    def test_compressed_search(self):
+
+        compressed_crm = LACRM(location, compress_requests=True,
+                               compress_threshold=0)
+        search_result = compressed_crm.search_contacts(
+            test_contact['FullName'], NumRows=500)
+        print("Compressed Search Data: ", compressed_crm.transfer_stats,
+              search_result, end="\n" * 2)
+        self.assertEqual(search_result.status_code, 200)
+        stats = compressed_crm.transfer_stats
+        self.assertEqual(stats.requests, 1)
+        # Either the gzip request went through or it was resent uncompressed
+        self.assertEqual(stats.compressed_requests + stats.fallbacks, 1)
+
+    def test_change_feed(self):
+
+        feed = ChangeFeed(crm, test_contact['FullName'], track_pipelines=False)
+        events = []
+        feed.subscribe(events.append)
+
+        self.assertEqual(feed.poll(), [])
+        feed.poll()
+        print("Change Feed Data: ", events, feed.interval, end="\n" * 2)
+        self.assertEqual(events, [])
+        self.assertEqual(feed.interval, feed.min_interval * 4)
 
     def test_create_note(self):
 
@@ -74,6 +106,18 @@ class CRMTest(unittest.TestCase):
         print("Create Note Data: ", result.text, result, end="\n" * 2)
         self.assertEqual(result.status_code, 200)
 
+    def test_coalesce_notes(self):
+
+        with NoteCoalescer(crm, max_delay=60) as coalescer:
+            for i in range(3):
+                coalescer.add(test_contact['ContactId'],
+                              'API Coalesced Note {}'.format(i))
+        print("Coalesce Notes Data: ", coalescer.requests_sent,
+              coalescer.reduction_ratio, end="\n" * 2)
+        self.assertEqual(coalescer.requests_succeeded, 1)
+        self.assertEqual(coalescer.notes_delivered, 3)
+        self.assertEqual(coalescer.failed_requests, 0)
+
     def test_create_task(self):
 
         result = crm.create_task(
@@ -101,7 +145,7 @@ class CRMTest(unittest.TestCase):
         result = crm.create_pipeline(
             test_contact['ContactId'], pipeline_id, status_id)
         print("Create Pipeline Data: ", result.text, result, end="\n" * 2)
-        new_pipeline_id = json.loads(result.text)['PipelineItemId']
+        new_pipeline_id = result['PipelineItemId']
         self.assertEqual(result.status_code, 200)
 
         # Update Pipeline
@@ -109,6 +153,21 @@ class CRMTest(unittest.TestCase):
         print("Updating Pipeline Data: ", result.text, result, end="\n" * 2)
         self.assertEqual(result.status_code, 200)
 
+    def test_validation(self):
+
+        validator = Validator.from_crm(crm)
+        checked_crm = LACRM(location, validator=validator)
+
+        with self.assertRaises(ValidationError) as context:
+            checked_crm.search_contacts(test_contact['FullName'], NumRows=501)
+        print("Validation Data: ", context.exception.errors, end="\n" * 2)
+        self.assertEqual(context.exception.errors[0].field, 'NumRows')
+
+        failures = validator.validate_many('CreateTask', [
+            {'DueDate': '2028-06-26', 'Name': 'Valid'},
+            {'DueDate': '26/06/2028', 'Name': 'Invalid'}])
+        self.assertEqual(list(failures), [1])
+
     def test_pipeline_attached(self):
 
         result = crm.get_pipeline_items_attached_to_contact(
@@ -122,6 +181,18 @@ class CRMTest(unittest.TestCase):
         print("Get Pipeline Report Data: ", result.text, result, end="\n" * 2)
         self.assertEqual(result.status_code, 200)
 
+    def test_pipeline_aggregator(self):
+
+        aggregator = PipelineAggregator(crm, pipeline_id)
+        stats = aggregator.refresh()
+        print("Pipeline Aggregator Data: ", stats.to_dict(), end="\n" * 2)
+
+        # Nothing changed, so every page is reused instead of aggregated
+        aggregator.refresh()
+        self.assertGreater(aggregator.pages_reused, 0)
+        self.assertEqual(aggregator.pages_aggregated, 0)
+        self.assertEqual(aggregator.stats.total, stats.total)
+
     def test_pipeline_settings(self):
 
         result = crm.get_pipeline_settings()